@@ -1,10 +1,16 @@
 import argparse
+import logging
+import time
 import numpy as np
 
 import pygame as pg
 
 from .cpu import CPU
+from .debugger import Debugger, SocketConsole, parse_address
+from .quirks import QUIRK_PROFILES
 from .screen import Screen
+from .telemetry import Telemetry
+from .trace import DEFAULT_CAPACITY, Tracer, parse_capacity, parse_registers
 
 KEY_MAP = {
     pg.K_0: 0x0,
@@ -30,27 +36,93 @@ def main() -> None:
     parser = argparse.ArgumentParser()
     parser.add_argument("--rom-path", help="Path to ROM file to run")
     parser.add_argument("--debug", default=False, action='store_true', help="Run in debug mode")
-    parser.add_argument("--stepper", default=False, action='store_true', help="Run with stepper")
+    parser.add_argument("--stepper", default=False, action='store_true', help="Run with stepper, pausing in the debugger before the first instruction")
+    parser.add_argument("--break", dest="breakpoints", metavar="ADDR", type=parse_address, action="append", default=[], help="Break before executing ADDR, can be repeated")
+    parser.add_argument("--debugger-port", type=int, help="Read debugger commands from localhost:PORT instead of stdin")
+    parser.add_argument("--quirks", default="modern", choices=QUIRK_PROFILES, help="Quirk profile the ROM was written for")
+    parser.add_argument("--trace", metavar="PATH", help="Record executed instructions, written to PATH on F12 or on error")
+    parser.add_argument("--trace-size", type=parse_capacity, default=DEFAULT_CAPACITY, help="Number of instructions kept in the trace")
+    parser.add_argument("--trace-registers", type=parse_registers, default="0123456789abcdef",
+                        help="Registers to record, e.g. 01f for V0, V1 and VF")
+    parser.add_argument("--instructions-per-frame", type=int, help="Run this many instructions per 60 Hz frame instead of as fast as possible")
+    parser.add_argument("--telemetry", default=False, action='store_true', help="Log instructions per second and frame times")
+    parser.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics on localhost:PORT/metrics, implies --telemetry")
     args = parser.parse_args()
 
     screen = Screen(debug=args.debug)
-    cpu = CPU(screen)
+    cpu = CPU(screen, QUIRK_PROFILES[args.quirks])
     cpu.load_rom(args.rom_path, 0x200)
 
+    tracer = None
+    if args.trace:
+        tracer = Tracer(cpu, args.trace_size, args.trace_registers, args.trace)
+        tracer.attach()
+
+    debugger = Debugger(cpu)
+    if args.debugger_port:
+        debugger.console = SocketConsole(args.debugger_port)
+    for address in args.breakpoints:
+        debugger.breakpoints[address] = 1
+    debugger.rearm()
+    if args.stepper:
+        debugger.interrupt("stepper")
+
+    telemetry = None
+    if args.telemetry or args.metrics_port:
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+        # without pacing there is no frame deadline to be late for
+        telemetry = Telemetry(frame_rate=60 if args.instructions_per_frame else None)
+        telemetry.attach_screen(screen)
+        if args.metrics_port:
+            telemetry.serve(args.metrics_port)
+
+    paced = args.instructions_per_frame is not None
+    instructions_per_frame = args.instructions_per_frame if paced else 1
+    period = 1 / 60
+    start = time.perf_counter()
+    next_frame = start + period
+    frame_instructions = 0
+
     while True:
-        # Pretty hacky way to step through each instruction
-        if args.stepper:
-            input()
+        for _ in range(instructions_per_frame):
+            cpu.execute()
+        # the timers count down at 60 Hz when paced, unthrottled they tick with every instruction
+        cpu.tick_timers()
 
-        cpu.execute()
+        debugger.poll()
 
         for event in pg.event.get():
             if event.type == pg.KEYDOWN:
                 if event.key in KEY_MAP:
                     cpu.keys[KEY_MAP[event.key]] = 1
+                elif event.key == pg.K_F11:
+                    debugger.interrupt()
+                elif event.key == pg.K_F12 and tracer:
+                    tracer.dump()
             elif event.type == pg.KEYUP:
                 if event.key in KEY_MAP:
                     cpu.keys[KEY_MAP[event.key]] = 0
 
+        if paced:
+            end = time.perf_counter()
+            if telemetry:
+                telemetry.frame(start, end, instructions_per_frame)
+            if next_frame > end:
+                time.sleep(next_frame - end)
+                next_frame += period
+            else:
+                # late, don't try to catch up
+                next_frame = end + period
+            start = time.perf_counter()
+        elif telemetry:
+            # unthrottled, telemetry frames are 1/60 s of wall time
+            frame_instructions += 1
+            end = time.perf_counter()
+            if end >= next_frame:
+                telemetry.frame(start, end, frame_instructions)
+                start = end
+                next_frame = end + period
+                frame_instructions = 0
+
 if __name__ == "__main__":
     main()
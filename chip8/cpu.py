@@ -1,10 +1,11 @@
 import numpy as np
 import random
 
+from .quirks import MODERN, Quirks
 from .screen import Screen
 
 class CPU():
-    def  __init__(self, screen: Screen) -> None:
+    def  __init__(self, screen: Screen, quirks: Quirks = MODERN) -> None:
         """
         Initialize the CPU
         """
@@ -29,6 +30,49 @@ class CPU():
 
         self.current_opcode = np.uint16()            # the current opcode to execute
 
+        self.bind_quirks(quirks)
+
+    def bind_quirks(self, quirks: Quirks) -> None:
+        """
+        Bind the instruction variants matching the quirk profile, so execute never
+        has to check quirk flags
+        """
+        self.quirks = quirks
+
+        if quirks.vf_reset:
+            self.logical_or = self.vx_or_vy_reset_vf
+            self.logical_and = self.vx_and_vy_reset_vf
+            self.logical_xor = self.vx_xor_vy_reset_vf
+        else:
+            self.logical_or = self.vx_or_vy
+            self.logical_and = self.vx_and_vy
+            self.logical_xor = self.vx_xor_vy
+
+        if quirks.shift_vy:
+            self.shift_right = self.shift_right_vy
+            self.shift_left = self.shift_left_vy
+        else:
+            self.shift_right = self.shift_right_vx
+            self.shift_left = self.shift_left_vx
+
+        if quirks.jump_vx:
+            self.jump_with_offset = self.jump_to_location_xnn_plus_vx
+        else:
+            self.jump_with_offset = self.jump_to_location_nnn_plus_v0
+
+        if quirks.clip_sprites:
+            self.draw_sprite = self.display_sprite_clipped
+        else:
+            self.draw_sprite = self.display_sprite
+
+        if quirks.memory_increment is None:
+            self.store_registers = self.regs_to_memory
+            self.load_registers = self.read_regs_from_memory
+        else:
+            self.memory_increment = quirks.memory_increment
+            self.store_registers = self.regs_to_memory_increment_ir
+            self.load_registers = self.read_regs_from_memory_increment_ir
+
     def load_rom(self, rom_path: str, offset: int) -> None:
         """
         Load the ROM into memory
@@ -49,6 +93,18 @@ class CPU():
         print([hex(v) for v in self.v[:8]])
         print([hex(v) for v in self.v[8:]])
 
+    def tick_timers(self) -> None:
+        """
+        Count the delay and sound timers down by one, meant to be called at 60 Hz
+        """
+        if self.delay_timer > 0:
+            self.delay_timer -= 1
+
+        if self.sound_timer > 0:
+            # if sound_timer == 1:
+            #    TODO: Implement sound
+            self.sound_timer -= 1
+
     def execute(self) -> None:
         self.current_opcode = self.memory[self.pc] << 8 | self.memory[self.pc + 1]  # 2 bytes
 
@@ -90,13 +146,13 @@ class CPU():
                 self.set_vx_vy()
             # 8XY1 - Set Vx = Vx OR Vy
             elif self.current_opcode & 0x000F == 0x0001:
-                self.vx_or_vy()
+                self.logical_or()
             # 8XY2 - Set Vx = Vx AND Vy
             elif self.current_opcode & 0x000F == 0x0002:
-                self.vx_and_vy()
+                self.logical_and()
             # 8XY3 - Set Vx = Vx XOR Vy
             elif self.current_opcode & 0x000F == 0x0003:
-                self.vx_xor_vy()
+                self.logical_xor()
             # 8XY4 - Set Vx = Vx + Vy, set VF = carry
             elif self.current_opcode & 0x000F == 0x0004:
                 self.vx_add_vy()
@@ -105,13 +161,13 @@ class CPU():
                 self.vx_sub_vy()
             # 8XY6 - Set Vx = Vx SHR 1
             elif self.current_opcode & 0x000F == 0x0006:
-                self.shift_right_vx()
+                self.shift_right()
             # 8XY7 - Set Vx = Vy - Vx, set VF = NOT borrow
             elif self.current_opcode & 0x000F == 0x0007:
                 self.vy_sub_vx()
             # 0x000E - Set Vx = Vx SHL 1
             elif self.current_opcode & 0x000F == 0x000E:
-                self.shift_left_vx()
+                self.shift_left()
             else:
                 raise Exception("Invalid opcode {}".format(hex(self.current_opcode)))
         # 9XY0 - Skip next instruction if Vx != Vy
@@ -122,13 +178,13 @@ class CPU():
             self.set_ir_to_nnn()
         # BNNN - Jump to location nnn + V0
         elif self.current_opcode & 0xF000 == 0xB000:
-            self.jump_to_location_nnn_plus_v0()
+            self.jump_with_offset()
         # CXKK - Set Vx = random byte AND kk
         elif self.current_opcode & 0xF000 == 0xC000:
             self.vx_random_byte_masked_by_kk()
         # DXYN - Display n-byte sprite starting at memory location I at (Vx, Vy), set VF = collision
         elif self.current_opcode & 0xF000 == 0xD000:
-            self.display_sprite()
+            self.draw_sprite()
         # EX__
         elif self.current_opcode & 0xF000 == 0xE000:
             # EX9E - Skip next instruction if key with the value of Vx is pressed
@@ -164,10 +220,10 @@ class CPU():
                 self.bcd_rep_vx()
             # FX55 - Store registers V0 through Vx in memory starting at location I
             elif self.current_opcode & 0x00FF == 0x0055:
-                self.regs_to_memory()
+                self.store_registers()
             # FX65 - Read registers V0 through Vx from memory starting at location I
             elif self.current_opcode & 0x00FF == 0x0065:
-                self.read_regs_from_memory()
+                self.load_registers()
             else:
                 raise Exception("Invalid opcode {}".format(hex(self.current_opcode)))
         else:
@@ -175,14 +231,6 @@ class CPU():
 
         self.pc += 2 # Increment program counter
 
-        if self.delay_timer > 0:
-            self.delay_timer -= 1
-
-        if self.sound_timer > 0:
-            # if sound_timer == 1:
-            #    TODO: Implement sound
-            self.sound_timer -= 1
-
         if self.screen.debug:
             self.screen.draw_debug(
                 self.pc,
@@ -239,6 +287,7 @@ class CPU():
         self.stack[self.sp] = self.pc
         self.sp += 1
         self.pc = self.current_opcode & 0x0FFF
+        self.pc -= 2 # to make up for us incrementing the pc counter later
 
     def skip_next_instruction_if_vx_kk(self) -> None:
         """
@@ -309,7 +358,15 @@ class CPU():
         A bitwise OR compares the corrseponding bits from two values, and if either bit is 1,
         then the same bit in the result is also 1. Otherwise, it is 0.
         """
-        self.v[(self.current_opcode & 0x0F00) >> 8] = self.v[(self.current_opcode & 0x0F00) >> 8] or self.v[(self.current_opcode & 0x00F0) >> 4]
+        self.v[(self.current_opcode & 0x0F00) >> 8] = self.v[(self.current_opcode & 0x0F00) >> 8] | self.v[(self.current_opcode & 0x00F0) >> 4]
+
+    def vx_or_vy_reset_vf(self) -> None:
+        """
+        8xy1 - OR Vx, Vy
+        Set Vx = Vx OR Vy, set VF = 0 (COSMAC VIP quirk).
+        """
+        self.vx_or_vy()
+        self.v[0xF] = 0
 
     def vx_and_vy(self) -> None:
         """
@@ -320,7 +377,15 @@ class CPU():
         A bitwise AND compares the corrseponding bits from two values, and if both bits are 1,
         then the same bit in the result is also 1. Otherwise, it is 0.
         """
-        self.v[(self.current_opcode & 0x0F00) >> 8] = self.v[(self.current_opcode & 0x0F00) >> 8] and self.v[(self.current_opcode & 0x00F0) >> 4]
+        self.v[(self.current_opcode & 0x0F00) >> 8] = self.v[(self.current_opcode & 0x0F00) >> 8] & self.v[(self.current_opcode & 0x00F0) >> 4]
+
+    def vx_and_vy_reset_vf(self) -> None:
+        """
+        8xy2 - AND Vx, Vy
+        Set Vx = Vx AND Vy, set VF = 0 (COSMAC VIP quirk).
+        """
+        self.vx_and_vy()
+        self.v[0xF] = 0
 
     def vx_xor_vy(self) -> None:
         """
@@ -333,6 +398,14 @@ class CPU():
         """
         self.v[(self.current_opcode & 0x0F00) >> 8] = self.v[(self.current_opcode & 0x0F00) >> 8] ^ self.v[(self.current_opcode & 0x00F0) >> 4]
 
+    def vx_xor_vy_reset_vf(self) -> None:
+        """
+        8xy3 - XOR Vx, Vy
+        Set Vx = Vx XOR Vy, set VF = 0 (COSMAC VIP quirk).
+        """
+        self.vx_xor_vy()
+        self.v[0xF] = 0
+
     def vx_add_vy(self) -> None:
         """
         8xy4 - ADD Vx, Vy
@@ -371,11 +444,21 @@ class CPU():
         If the least-significant bit of Vx is 1, then VF is set to 1, otherwise 0.
         Then Vx is divided by 2.
         """
-        if self.v[(self.current_opcode & 0x0F00) >> 8] & 0x1 == 1:
-            self.v[0xF] = 1
-        else:
-            self.v[0xF] = 0
+        flag = self.v[(self.current_opcode & 0x0F00) >> 8] & 0x1
         self.v[(self.current_opcode & 0x0F00) >> 8] >>= 1
+        self.v[0xF] = flag
+
+    def shift_right_vy(self) -> None:
+        """
+        8xy6 - SHR Vx, Vy
+        Set Vx = Vy SHR 1 (COSMAC VIP quirk).
+
+        If the least-significant bit of Vy is 1, then VF is set to 1, otherwise 0.
+        Then Vx is set to Vy divided by 2.
+        """
+        flag = self.v[(self.current_opcode & 0x00F0) >> 4] & 0x1
+        self.v[(self.current_opcode & 0x0F00) >> 8] = self.v[(self.current_opcode & 0x00F0) >> 4] >> 1
+        self.v[0xF] = flag
 
     def vy_sub_vx(self) -> None:
         """
@@ -399,11 +482,21 @@ class CPU():
         If the most-significant bit of Vx is 1, then VF is set to 1, otherwise to 0.
         Then Vx is multiplied by 2.
         """
-        if self.v[(self.current_opcode & 0x0F00) >> 8] >> 7 == 1:
-            self.v[0xF] = 1
-        else:
-            self.v[0xF] = 0
+        flag = self.v[(self.current_opcode & 0x0F00) >> 8] >> 7
         self.v[(self.current_opcode & 0x0F00) >> 8] <<= 1
+        self.v[0xF] = flag
+
+    def shift_left_vy(self) -> None:
+        """
+        8xyE - SHL Vx, Vy
+        Set Vx = Vy SHL 1 (COSMAC VIP quirk).
+
+        If the most-significant bit of Vy is 1, then VF is set to 1, otherwise to 0.
+        Then Vx is set to Vy multiplied by 2.
+        """
+        flag = self.v[(self.current_opcode & 0x00F0) >> 4] >> 7
+        self.v[(self.current_opcode & 0x0F00) >> 8] = (self.v[(self.current_opcode & 0x00F0) >> 4] << 1) & 0xFF
+        self.v[0xF] = flag
 
     def skip_next_instruction_if_vx_not_vy(self) -> None:
         """
@@ -432,7 +525,18 @@ class CPU():
 
         The program counter is set to nnn plus the value of V0.
         """
-        self.ir = (self.current_opcode & 0x0FFF) + self.v[0]
+        self.pc = (self.current_opcode & 0x0FFF) + int(self.v[0])
+        self.pc -= 2 # to make up for us incrementing the pc counter later
+
+    def jump_to_location_xnn_plus_vx(self) -> None:
+        """
+        Bxnn - JP Vx, addr
+        Jump to location xnn + Vx (CHIP-48 and SUPER-CHIP quirk).
+
+        The program counter is set to xnn plus the value of Vx.
+        """
+        self.pc = (self.current_opcode & 0x0FFF) + int(self.v[(self.current_opcode & 0x0F00) >> 8])
+        self.pc -= 2 # to make up for us incrementing the pc counter later
 
     def vx_random_byte_masked_by_kk(self) -> None:
         """
@@ -478,6 +582,34 @@ class CPU():
         self.screen.update()
         self.draw_flag = True
 
+    def display_sprite_clipped(self) -> None:
+        """
+        Dxyn - DRW Vx, Vy, nibble
+        Display n-byte sprite starting at memory location I at (Vx, Vy), set VF = collision.
+
+        Same as display_sprite, except that only the starting coordinates wrap around;
+        the parts of the sprite that are outside the display are clipped.
+        """
+        x = int(self.v[(self.current_opcode & 0x0F00) >> 8]) % 64
+        y = int(self.v[(self.current_opcode & 0x00F0) >> 4]) % 32
+        n = self.current_opcode & 0x000F
+
+        self.v[0xF] = 0
+
+        for y_pos in range(min(n, 32 - y)):
+            pixel = self.memory[self.ir + y_pos]
+            for x_pos in range(min(8, 64 - x)):
+                if pixel & (0x80 >> x_pos) != 0:
+                    x_coord = x + x_pos
+                    y_coord = y + y_pos
+                    if self.gb[x_coord + (y_coord * 64)] == 1:
+                        self.v[0xF] = 1
+                    self.gb[x_coord  + (y_coord * 64)] ^= 1
+                    self.screen.draw_pixel(x_coord, y_coord, self.gb[x_coord + (y_coord * 64)])
+
+        self.screen.update()
+        self.draw_flag = True
+
     def skip_next_instruction_if_vx_is_pressed(self) -> None:
         """
         Ex9E - SKP Vx
@@ -589,9 +721,18 @@ class CPU():
         The interpreter copies the values of registers V0 through Vx into memory,
         starting at the address in I.
         """
-        for i in range((self.current_opcode & 0x0F00) >> 8):
+        for i in range(((self.current_opcode & 0x0F00) >> 8) + 1):
             self.memory[self.ir + i] = self.v[i]
 
+    def regs_to_memory_increment_ir(self) -> None:
+        """
+        Fx55 - LD [I], Vx
+        Store registers V0 through Vx in memory starting at location I,
+        then set I = I + x + memory_increment (COSMAC VIP and CHIP-48 quirk).
+        """
+        self.regs_to_memory()
+        self.ir += ((self.current_opcode & 0x0F00) >> 8) + self.memory_increment
+
     def read_regs_from_memory(self) -> None:
         """
         Fx65 - LD Vx, [I]
@@ -600,5 +741,14 @@ class CPU():
         The interpreter reads values from memory starting at location I into registers
         V0 through Vx.
         """
-        for i in range((self.current_opcode & 0x0F00) >> 8):
+        for i in range(((self.current_opcode & 0x0F00) >> 8) + 1):
             self.v[i] = self.memory[self.ir + i]
+
+    def read_regs_from_memory_increment_ir(self) -> None:
+        """
+        Fx65 - LD Vx, [I]
+        Read registers V0 through Vx from memory starting at location I,
+        then set I = I + x + memory_increment (COSMAC VIP and CHIP-48 quirk).
+        """
+        self.read_regs_from_memory()
+        self.ir += ((self.current_opcode & 0x0F00) >> 8) + self.memory_increment
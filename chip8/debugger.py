@@ -0,0 +1,445 @@
+import ast
+import operator
+import queue
+import socket
+import sys
+import threading
+from typing import Optional
+
+import numpy as np
+
+HELP = """commands
+  c, continue               resume execution
+  s, step [n]               execute n instructions (default 1)
+  n, next                   step over a 2NNN call
+  o, out                    run until the current subroutine returns (00EE)
+  f, frame                  run until the next 00E0/DXYN draw
+  b, break ADDR [if EXPR]   break before executing ADDR, EXPR is a comparison of integers, v0-vf, v[N], i,
+                            pc, sp, dt, st and mem[N], combined with + - & | ^ << >> ~ and/or/not
+  d, delete ADDR            remove a breakpoint
+  w, watch ADDR[-END]|vX|i  break after an instruction changes memory, a register or I
+  u, unwatch ADDR[-END]|vX|i
+  l, list                   list breakpoints and watchpoints
+  r, regs                   print the CPU state
+  x ADDR [N]                print N bytes of memory starting at ADDR
+  q, quit                   remove all breakpoints and watchpoints, then resume
+an empty line repeats the last command
+"""
+
+
+def shift_left(value: int, bits: int) -> int:
+    # CHIP-8 values are at most 16 bits wide, larger shifts are a typo or an attempt to exhaust memory
+    if not 0 <= bits <= 16:
+        raise ValueError("shift by {} is out of range".format(bits))
+    return value << bits
+
+
+CONDITION_MAX_LENGTH = 200
+CONDITION_MAX_DEPTH = 32
+CONDITION_NAMES = {"v{:x}".format(r) for r in range(16)} | {"v", "i", "pc", "sp", "dt", "st", "mem"}
+CONDITION_OPERATORS = {
+    ast.Eq: operator.eq, ast.NotEq: operator.ne,
+    ast.Lt: operator.lt, ast.LtE: operator.le, ast.Gt: operator.gt, ast.GtE: operator.ge,
+    ast.Add: operator.add, ast.Sub: operator.sub,
+    ast.BitAnd: operator.and_, ast.BitOr: operator.or_, ast.BitXor: operator.xor,
+    ast.LShift: shift_left, ast.RShift: operator.rshift,
+    ast.Invert: operator.invert, ast.USub: operator.neg, ast.Not: operator.not_,
+}
+
+
+def parse_condition(source: str) -> ast.expr:
+    """
+    Parse a breakpoint condition, which may only use comparisons, and/or/not,
+    integer arithmetic and bitwise operators, integers, the CPU state names and
+    indexing into v and mem. Nothing is ever passed to eval.
+
+    Long or deeply nested conditions are rejected before they can exhaust the
+    parser's or the evaluator's stack.
+    """
+    if len(source) > CONDITION_MAX_LENGTH:
+        raise ValueError("conditions are limited to {} characters".format(CONDITION_MAX_LENGTH))
+    try:
+        tree = ast.parse(source, mode="eval").body
+    except (RecursionError, MemoryError):
+        raise ValueError("condition is nested too deeply")
+
+    nodes = [(tree, 1)]
+    while nodes:
+        node, depth = nodes.pop()
+        if depth > CONDITION_MAX_DEPTH:
+            raise ValueError("conditions are limited to {} levels of nesting".format(CONDITION_MAX_DEPTH))
+        nodes += [(child, depth + 1) for child in ast.iter_child_nodes(node)]
+
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.BoolOp, ast.And, ast.Or, ast.Compare, ast.BinOp, ast.UnaryOp, ast.Load)):
+            continue
+        if type(node) in CONDITION_OPERATORS:
+            continue
+        if isinstance(node, ast.Constant) and type(node.value) is int:
+            continue
+        if isinstance(node, ast.Name) and node.id in CONDITION_NAMES:
+            continue
+        if isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name) and node.value.id in ("v", "mem"):
+            continue
+        raise ValueError("{} is not allowed in conditions".format(ast.unparse(node) if isinstance(node, ast.expr) else type(node).__name__))
+    return tree
+
+
+def evaluate_condition(node: ast.expr, names: dict) -> int:
+    if isinstance(node, ast.Constant):
+        return node.value
+    if isinstance(node, ast.Name):
+        return names[node.id]
+    if isinstance(node, ast.Subscript):
+        return int(names[node.value.id][evaluate_condition(node.slice, names)])
+    if isinstance(node, ast.UnaryOp):
+        return CONDITION_OPERATORS[type(node.op)](evaluate_condition(node.operand, names))
+    if isinstance(node, ast.BinOp):
+        return CONDITION_OPERATORS[type(node.op)](evaluate_condition(node.left, names), evaluate_condition(node.right, names))
+    if isinstance(node, ast.BoolOp):
+        if isinstance(node.op, ast.And):
+            return all(evaluate_condition(value, names) for value in node.values)
+        return any(evaluate_condition(value, names) for value in node.values)
+    # chained comparisons, e.g. 0x10 <= v0 < 0x20
+    left = evaluate_condition(node.left, names)
+    for op, comparator in zip(node.ops, node.comparators):
+        right = evaluate_condition(comparator, names)
+        if not CONDITION_OPERATORS[type(op)](left, right):
+            return False
+        left = right
+    return True
+
+
+def parse_address(text: str) -> int:
+    address = int(text, 0)
+    if not 0 <= address <= 0xFFF:
+        raise ValueError("address {} is outside memory".format(text))
+    return address
+
+
+class StdioConsole():
+    """
+    Debugger console reading commands from stdin
+    """
+    def readline(self, prompt: str) -> str:
+        return input(prompt)
+
+    def poll(self) -> bool:
+        return False
+
+    def write(self, text: str) -> None:
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
+
+class SocketConsole():
+    def __init__(self, port: int) -> None:
+        """
+        Debugger console reading commands from a local TCP connection, e.g. `nc localhost PORT`.
+
+        Lines are received on a background thread and only queued there, the
+        thread running the CPU picks them up through Debugger.poll.
+        """
+        self.server = socket.create_server(("127.0.0.1", port))
+        self.connection = None
+        self.lines = queue.Queue()
+
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self) -> None:
+        while True:
+            self.connection, _ = self.server.accept()
+            with self.connection, self.connection.makefile("r") as lines:
+                for line in lines:
+                    self.lines.put(line.rstrip("\r\n"))
+            self.connection = None
+
+    def readline(self, prompt: str) -> str:
+        self.write(prompt)
+        return self.lines.get()
+
+    def poll(self) -> bool:
+        """
+        Whether a command was received that hasn't been read yet
+        """
+        return not self.lines.empty()
+
+    def write(self, text: str) -> None:
+        if self.connection:
+            try:
+                self.connection.sendall(text.encode())
+            except OSError:
+                pass
+
+
+class Debugger():
+    def __init__(self, cpu, console=None) -> None:
+        """
+        Breakpoints, watchpoints and stepping for a CPU.
+
+        While nothing is armed the CPU's own execute runs untouched. Arming anything
+        binds execute_checked in its place, which looks breakpoints up in a bitmap
+        and compares only the watched memory and registers.
+        """
+        self.cpu = cpu
+        self.console = console or StdioConsole()
+
+        self.breakpoints = bytearray(4096)   # 1 for every address with a breakpoint
+        self.conditions = {}                 # address -> (source, code) for conditional breakpoints
+
+        self.watched_memory = bytearray(4096)
+        self.memory_watch = np.zeros(0, dtype=np.intp)
+        self.memory_snapshot = np.zeros(0, dtype=np.uint8)
+
+        self.watched_registers = set()
+        self.register_watch = np.zeros(0, dtype=np.intp)
+        self.register_snapshot = np.zeros(0, dtype=np.uint8)
+        self.watch_ir = False
+        self.ir_snapshot = 0
+
+        self.until = None                    # stop after the instruction for which this returns True
+        self.pending = None                  # reason to pause before the next instruction
+        self.paused = False
+        self.last_command = "step"
+
+        self.execute = None                  # the execute that was bound before arming
+        self.armed = False
+
+    def rearm(self) -> None:
+        """
+        Bind or unbind execute_checked depending on whether anything can stop the CPU
+        """
+        armed = bool(
+            any(self.breakpoints)
+            or self.memory_watch.size
+            or self.register_watch.size
+            or self.watch_ir
+            or self.until
+            or self.pending
+        )
+        if armed and not self.armed:
+            self.execute = self.cpu.execute
+            self.cpu.execute = self.execute_checked
+        elif not armed and self.armed:
+            self.cpu.execute = self.execute
+            self.execute = None
+        self.armed = armed
+
+    def interrupt(self, reason: str = "interrupted") -> None:
+        """
+        Pause before the next instruction, must be called from the thread running the CPU
+        """
+        if not self.paused:
+            self.pending = reason
+            self.rearm()
+
+    def poll(self) -> None:
+        """
+        Pause before the next instruction if a command is waiting on the console,
+        called from the main loop between frames
+        """
+        if self.console.poll():
+            self.interrupt("command received")
+
+    def execute_checked(self) -> None:
+        cpu = self.cpu
+
+        reason = self.pending
+        if reason is None and self.breakpoints[cpu.pc]:
+            reason = self.check_breakpoint(cpu.pc)
+        if reason is not None:
+            self.pending = None
+            self.pause(reason)
+            if not self.armed:
+                self.cpu.execute()
+                return
+
+        self.execute()
+
+        if self.memory_watch.size:
+            values = cpu.memory[self.memory_watch]
+            changed = self.memory_watch[values != self.memory_snapshot]
+            if changed.size:
+                self.memory_snapshot = values
+                self.pending = "memory changed at " + ", ".join(hex(a) for a in changed)
+        if self.register_watch.size:
+            values = cpu.v[self.register_watch]
+            changed = self.register_watch[values != self.register_snapshot]
+            if changed.size:
+                self.register_snapshot = values
+                self.pending = "register changed: " + ", ".join("v{:x}".format(r) for r in changed)
+        if self.watch_ir and cpu.ir != self.ir_snapshot:
+            self.ir_snapshot = cpu.ir
+            self.pending = "i changed"
+        if self.until is not None and self.until(cpu):
+            self.until = None
+            self.pending = self.pending or "stopped"
+
+    def check_breakpoint(self, pc: int) -> Optional[str]:
+        condition = self.conditions.get(int(pc))
+        if condition is None:
+            return "breakpoint at {:03x}".format(pc)
+        source, tree = condition
+        try:
+            if evaluate_condition(tree, self.namespace()):
+                return "breakpoint at {:03x} if {}".format(pc, source)
+        except Exception as e:
+            return "breakpoint at {:03x}, condition {} failed: {}".format(pc, source, e)
+        return None
+
+    def namespace(self) -> dict:
+        cpu = self.cpu
+        names = {"v{:x}".format(r): int(cpu.v[r]) for r in range(16)}
+        names.update(v=cpu.v, i=int(cpu.ir), pc=int(cpu.pc), sp=int(cpu.sp), dt=int(cpu.delay_timer), st=int(cpu.sound_timer), mem=cpu.memory)
+        return names
+
+    def pause(self, reason: str) -> None:
+        """
+        Read and run commands until one of them resumes execution
+        """
+        self.paused = True
+        self.console.write("{}\n{}".format(reason, self.state()))
+        try:
+            while True:
+                try:
+                    line = self.console.readline("(chip8) ").strip() or self.last_command
+                except EOFError:
+                    line = "quit"
+                self.last_command = line
+                try:
+                    if self.command(line):
+                        break
+                except (ValueError, IndexError, SyntaxError, RecursionError, MemoryError) as e:
+                    self.console.write("error: {}\n".format(e))
+        finally:
+            self.paused = False
+            self.rearm()
+
+    def command(self, line: str) -> bool:
+        """
+        Run a debugger command, returns True when execution should resume
+        """
+        command, _, argument = line.partition(" ")
+        argument = argument.strip()
+        cpu = self.cpu
+
+        if command in ("c", "continue"):
+            return True
+        elif command in ("s", "step"):
+            remaining = [int(argument or "1", 0)]
+            def until(cpu) -> bool:
+                remaining[0] -= 1
+                return remaining[0] <= 0
+            self.until = until
+            return True
+        elif command in ("n", "next"):
+            opcode = cpu.memory[cpu.pc] << 8 | cpu.memory[cpu.pc + 1]
+            if opcode & 0xF000 == 0x2000:
+                pc, sp = int(cpu.pc) + 2, int(cpu.sp)
+                self.until = lambda cpu: cpu.pc == pc and cpu.sp == sp
+            else:
+                self.until = lambda cpu: True
+            return True
+        elif command in ("o", "out"):
+            if cpu.sp == 0:
+                self.console.write("not in a subroutine\n")
+                return False
+            sp = int(cpu.sp)
+            self.until = lambda cpu: cpu.sp < sp
+            return True
+        elif command in ("f", "frame"):
+            cpu.draw_flag = False
+            self.until = lambda cpu: cpu.draw_flag
+            return True
+        elif command in ("b", "break"):
+            address, _, condition = argument.partition(" if ")
+            address = parse_address(address)
+            self.breakpoints[address] = 1
+            if condition:
+                self.conditions[address] = (condition, parse_condition(condition))
+            else:
+                self.conditions.pop(address, None)
+        elif command in ("d", "delete"):
+            address = parse_address(argument)
+            self.breakpoints[address] = 0
+            self.conditions.pop(address, None)
+        elif command in ("w", "watch"):
+            self.set_watch(argument, True)
+        elif command in ("u", "unwatch"):
+            self.set_watch(argument, False)
+        elif command in ("l", "list"):
+            self.console.write(self.listing())
+        elif command in ("r", "regs"):
+            self.console.write(self.state())
+        elif command == "x":
+            address, _, count = argument.partition(" ")
+            address = parse_address(address)
+            data = cpu.memory[address:address + int(count or "16", 0)]
+            for offset in range(0, len(data), 16):
+                self.console.write("{:03x}: {}\n".format(address + offset, " ".join("{:02x}".format(b) for b in data[offset:offset + 16])))
+        elif command in ("q", "quit"):
+            self.breakpoints = bytearray(4096)
+            self.conditions.clear()
+            self.watched_memory = bytearray(4096)
+            self.watched_registers.clear()
+            self.watch_ir = False
+            self.update_watches()
+            self.until = None
+            return True
+        elif command in ("h", "help"):
+            self.console.write(HELP)
+        else:
+            self.console.write("unknown command {}, try help\n".format(command))
+        return False
+
+    def set_watch(self, target: str, watch: bool) -> None:
+        if target == "i":
+            self.watch_ir = watch
+        elif target.startswith("v"):
+            register = int(target[1:], 16)
+            if not 0 <= register <= 0xF:
+                raise ValueError("no register {}".format(target))
+            if watch:
+                self.watched_registers.add(register)
+            else:
+                self.watched_registers.discard(register)
+        else:
+            start, _, end = target.partition("-")
+            start = parse_address(start)
+            end = parse_address(end) if end else start
+            if end < start:
+                raise ValueError("empty range {}".format(target))
+            self.watched_memory[start:end + 1] = bytes([watch]) * (end + 1 - start)
+        self.update_watches()
+
+    def update_watches(self) -> None:
+        """
+        Precompute the index arrays and snapshots checked after every instruction
+        """
+        self.memory_watch = np.flatnonzero(np.frombuffer(self.watched_memory, dtype=np.uint8))
+        self.memory_snapshot = self.cpu.memory[self.memory_watch]
+        self.register_watch = np.array(sorted(self.watched_registers), dtype=np.intp)
+        self.register_snapshot = self.cpu.v[self.register_watch]
+        self.ir_snapshot = self.cpu.ir
+
+    def listing(self) -> str:
+        lines = []
+        for address in np.flatnonzero(np.frombuffer(self.breakpoints, dtype=np.uint8)):
+            condition = self.conditions.get(int(address))
+            lines.append("break {:03x}{}".format(address, " if " + condition[0] if condition else ""))
+        if self.memory_watch.size:
+            lines.append("watch memory " + " ".join("{:03x}".format(a) for a in self.memory_watch))
+        if self.register_watch.size:
+            lines.append("watch " + " ".join("v{:x}".format(r) for r in self.register_watch))
+        if self.watch_ir:
+            lines.append("watch i")
+        return "".join(line + "\n" for line in lines) or "nothing armed\n"
+
+    def state(self) -> str:
+        cpu = self.cpu
+        opcode = cpu.memory[cpu.pc] << 8 | cpu.memory[cpu.pc + 1]
+        return (
+            "pc: {:03x} ({:04x}) sp: {:x} i: {:03x} dt: {:02x} st: {:02x}\n".format(cpu.pc, opcode, cpu.sp, cpu.ir, cpu.delay_timer, cpu.sound_timer)
+            + "v: " + " ".join("{:02x}".format(v) for v in cpu.v) + "\n"
+            + "stack: " + " ".join("{:03x}".format(s) for s in cpu.stack[:cpu.sp]) + "\n"
+        )
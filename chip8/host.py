@@ -0,0 +1,248 @@
+import argparse
+import asyncio
+import logging
+import time
+import tracemalloc
+from collections import deque
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+from .cpu import CPU
+from .quirks import MODERN, QUIRK_PROFILES, Quirks
+from .screen import HeadlessScreen
+from .telemetry import Telemetry
+
+TICK_RATE = 60                  # ticks per second
+INSTRUCTIONS_PER_TICK = 10      # roughly 600 instructions per second
+
+logger = logging.getLogger(__name__)
+
+
+class Session():
+    def __init__(self, session_id: str, rom_path: str, quirks: Quirks = MODERN, on_frame: Optional[Callable] = None) -> None:
+        """
+        A CPU without a window, driven by a SessionHost.
+
+        Key events are queued and applied at the start of the session's next slice.
+        Whenever the CPU draws, the 32x64 framebuffer is copied to `frame` and passed
+        to on_frame(session, frame).
+        """
+        self.session_id = session_id
+        self.cpu = CPU(HeadlessScreen(), quirks)
+        self.cpu.load_rom(rom_path, 0x200)
+
+        self.inputs = deque()            # (key, pressed) events not yet seen by the CPU
+        self.frame = self.cpu.gb.reshape(32, 64).copy()
+        self.on_frame = on_frame
+
+        self.paused = False
+        self.waiting_for_key = False     # blocked on FX0A with no key pressed
+        self.crashed = None              # the exception that stopped this session
+
+        self.ticks = 0
+        self.instructions = 0
+        self.busy_time = 0.0             # seconds spent running this session's slices
+
+    def run_slice(self, budget: int) -> None:
+        """
+        Apply queued input, execute up to `budget` instructions, then tick the timers once
+        """
+        start = time.perf_counter()
+        cpu = self.cpu
+
+        while self.inputs:
+            key, pressed = self.inputs.popleft()
+            cpu.keys[key] = pressed
+
+        for _ in range(budget):
+            cpu.execute()
+        cpu.tick_timers()
+
+        # FX0A rewinds the pc while no key is pressed, there is nothing to do until input arrives
+        self.waiting_for_key = (
+            cpu.current_opcode & 0xF0FF == 0xF00A
+            and not cpu.keys.any()
+            and cpu.memory[cpu.pc] << 8 | cpu.memory[cpu.pc + 1] == cpu.current_opcode
+        )
+
+        if cpu.draw_flag:
+            cpu.draw_flag = False
+            self.frame = cpu.gb.reshape(32, 64).copy()
+            if self.on_frame:
+                self.on_frame(self, self.frame)
+
+        self.ticks += 1
+        self.instructions += budget
+        self.busy_time += time.perf_counter() - start
+
+    def memory_size(self) -> int:
+        """
+        Bytes held by the CPU state arrays
+        """
+        cpu = self.cpu
+        return sum(a.nbytes for a in (cpu.v, cpu.memory, cpu.stack, cpu.gb, cpu.keys, self.frame))
+
+
+class SessionHost():
+    def __init__(self, instructions_per_tick: int = INSTRUCTIONS_PER_TICK, tick_rate: int = TICK_RATE, telemetry: Optional[Telemetry] = None, on_crash: Optional[Callable] = None) -> None:
+        """
+        Run many sessions in one process, cooperatively on the asyncio event loop.
+
+        Every tick, each runnable session executes the same instruction budget. Paused
+        sessions and sessions waiting for a key are skipped, and the host sleeps
+        until woken when no session can run. Each tick is recorded as one frame in
+        telemetry, if given.
+
+        A session whose slice raises is marked crashed and never runs again, the
+        exception is passed to on_crash(session, exception) or logged.
+        """
+        self.instructions_per_tick = instructions_per_tick
+        self.tick_rate = tick_rate
+        self.telemetry = telemetry
+        self.on_crash = on_crash
+        self.sessions: Dict[str, Session] = {}
+        self.wake = asyncio.Event()
+        self.offset = 0                  # rotates which session runs first in a tick
+
+        self.ticks = 0
+        self.late_ticks = 0
+
+    def add(self, session: Session) -> Session:
+        self.sessions[session.session_id] = session
+        self.wake.set()
+        return session
+
+    def remove(self, session_id: str) -> None:
+        del self.sessions[session_id]
+
+    def pause(self, session_id: str) -> None:
+        self.sessions[session_id].paused = True
+
+    def resume(self, session_id: str) -> None:
+        self.sessions[session_id].paused = False
+        self.wake.set()
+
+    def key(self, session_id: str, key: int, pressed: bool) -> None:
+        """
+        Queue a key press or release for a session
+        """
+        if not 0 <= key <= 0xF:
+            raise ValueError("key {} is not between 0 and f".format(key))
+        session = self.sessions[session_id]
+        session.inputs.append((key, 1 if pressed else 0))
+        session.waiting_for_key = False
+        self.wake.set()
+
+    def runnable(self) -> list:
+        return [s for s in self.sessions.values() if not s.paused and not s.waiting_for_key and not s.crashed]
+
+    def tick(self) -> list:
+        """
+        Order in which sessions run this tick, starting from a different session every tick
+        so none of them is always last when a tick overruns
+        """
+        sessions = self.runnable()
+        if not sessions:
+            return sessions
+        self.offset = (self.offset + 1) % len(sessions)
+        return sessions[self.offset:] + sessions[:self.offset]
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        period = 1 / self.tick_rate
+        next_tick = loop.time()
+
+        while True:
+            sessions = self.tick()
+            if not sessions:
+                if self.telemetry:
+                    self.telemetry.idle()
+                self.wake.clear()
+                await self.wake.wait()
+                next_tick = loop.time()
+                continue
+
+            start = time.perf_counter()
+            for session in sessions:
+                if not session.paused:
+                    try:
+                        session.run_slice(self.instructions_per_tick)
+                    except Exception as e:
+                        self.crash(session, e)
+                await asyncio.sleep(0)  # let input and output handlers run between sessions
+            self.ticks += 1
+            if self.telemetry:
+                self.telemetry.frame(start, time.perf_counter(), self.instructions_per_tick * len(sessions))
+
+            next_tick += period
+            delay = next_tick - loop.time()
+            if delay < 0:
+                # don't try to catch up, every session just runs slower than real time
+                self.late_ticks += 1
+                next_tick = loop.time()
+            await asyncio.sleep(max(delay, 0))
+
+    def crash(self, session: Session, exception: Exception) -> None:
+        session.crashed = exception
+        if self.on_crash:
+            self.on_crash(session, exception)
+        else:
+            logger.error("session %s crashed at pc %s: %s", session.session_id, hex(session.cpu.pc), exception)
+
+    def stats(self) -> str:
+        lines = ["ticks: {} late: {}".format(self.ticks, self.late_ticks)]
+        for session in self.sessions.values():
+            lines.append("{}: {} instructions, {:.1f}us per tick, {:.2f}us per instruction{}".format(
+                session.session_id,
+                session.instructions,
+                1e6 * session.busy_time / max(session.ticks, 1),
+                1e6 * session.busy_time / max(session.instructions, 1),
+                " (crashed: {})".format(session.crashed) if session.crashed
+                else " (waiting for key)" if session.waiting_for_key
+                else " (paused)" if session.paused else "",
+            ))
+        return "\n".join(lines)
+
+
+async def benchmark(args: argparse.Namespace) -> None:
+    host = SessionHost(args.instructions_per_tick, telemetry=Telemetry())
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(args.sessions):
+        host.add(Session(str(i), args.rom_path, QUIRK_PROFILES[args.quirks]))
+    session_memory = (tracemalloc.get_traced_memory()[0] - before) / args.sessions
+    tracemalloc.stop()
+
+    runner = asyncio.ensure_future(host.run())
+    await asyncio.sleep(args.seconds)
+    runner.cancel()
+
+    if args.verbose:
+        print(host.stats())
+    sessions = list(host.sessions.values())
+    busy = np.array([s.busy_time / max(s.ticks, 1) for s in sessions]) * 1e6
+    print("{} sessions, {} ticks in {}s ({} late)".format(len(sessions), host.ticks, args.seconds, host.late_ticks))
+    print("memory per session: {:.1f} KiB ({:.1f} KiB of CPU state)".format(session_memory / 1024, sessions[0].memory_size() / 1024))
+    print("time per session tick: mean {:.1f}us, max {:.1f}us, budget {:.1f}us".format(
+        busy.mean(), busy.max(), 1e6 / host.tick_rate / len(sessions)))
+    print("waiting for key: {}, crashed: {}".format(sum(s.waiting_for_key for s in sessions), sum(s.crashed is not None for s in sessions)))
+    print("emulated {:.0f} instructions per second while running".format(host.telemetry.instructions * host.tick_rate / max(host.ticks, 1)))
+    print(host.telemetry.summary())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m chip8.host", description="Run many headless sessions in one process and measure their cost")
+    parser.add_argument("--rom-path", required=True, help="Path to ROM file to run")
+    parser.add_argument("--quirks", default="modern", choices=QUIRK_PROFILES, help="Quirk profile the ROM was written for")
+    parser.add_argument("--sessions", type=int, default=100, help="Number of sessions")
+    parser.add_argument("--seconds", type=float, default=5, help="How long to run")
+    parser.add_argument("--instructions-per-tick", type=int, default=INSTRUCTIONS_PER_TICK, help="Instruction budget of a session per 60 Hz tick")
+    parser.add_argument("--verbose", default=False, action='store_true', help="Print the cost of every session")
+    args = parser.parse_args()
+
+    asyncio.run(benchmark(args))
+
+if __name__ == "__main__":
+    main()
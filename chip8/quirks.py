@@ -0,0 +1,30 @@
+from typing import NamedTuple, Optional
+
+class Quirks(NamedTuple):
+    """
+    Behaviours that differ between CHIP-8 interpreters.
+
+    shift_vy            8xy6/8xyE shift Vy into Vx instead of shifting Vx in place
+    memory_increment    Fx55/Fx65 leave I at I + x + memory_increment, or untouched when None
+    jump_vx             Bnnn is treated as BXNN and jumps to xnn + Vx instead of nnn + V0
+    clip_sprites        Dxyn clips sprites at the screen edge instead of wrapping them
+    vf_reset            8xy1/8xy2/8xy3 reset VF to 0
+    """
+    shift_vy: bool
+    memory_increment: Optional[int]
+    jump_vx: bool
+    clip_sprites: bool
+    vf_reset: bool
+
+# https://github.com/Timendus/chip8-test-suite#quirks-test
+COSMAC_VIP = Quirks(shift_vy=True, memory_increment=1, jump_vx=False, clip_sprites=True, vf_reset=True)
+CHIP_48 = Quirks(shift_vy=False, memory_increment=0, jump_vx=True, clip_sprites=True, vf_reset=False)
+SUPER_CHIP = Quirks(shift_vy=False, memory_increment=None, jump_vx=True, clip_sprites=True, vf_reset=False)
+MODERN = Quirks(shift_vy=False, memory_increment=None, jump_vx=False, clip_sprites=False, vf_reset=False)
+
+QUIRK_PROFILES = {
+    "cosmac-vip": COSMAC_VIP,
+    "chip-48": CHIP_48,
+    "super-chip": SUPER_CHIP,
+    "modern": MODERN,
+}
@@ -101,3 +101,22 @@ class Screen():
 
     def update(self) -> None:
         display.update()
+
+
+class HeadlessScreen():
+    """
+    Screen that draws nothing, for CPUs whose graphics buffer is read directly
+    """
+    debug = False
+
+    def draw_console(self, current_opcode: np.uint16) -> None:
+        pass
+
+    def draw_debug(self, pc: np.uint16, sp: np.uint16, ir: np.uint16, dt: np.uint8, st: np.uint8, v: np.ndarray, stack: np.ndarray) -> None:
+        pass
+
+    def draw_pixel(self, x_pos, y_pos, pixel_color) -> None:
+        pass
+
+    def update(self) -> None:
+        pass
@@ -0,0 +1,206 @@
+import logging
+import threading
+import time
+from typing import Optional
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+SUB_BUCKET_BITS = 5                      # 32 linear buckets per power of two, values within about 3%
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+BUCKETS = 1024                           # enough for over an hour in microseconds
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+class Histogram():
+    def __init__(self) -> None:
+        """
+        HDR-style histogram of durations, bucketed by the power of two of the value in
+        microseconds and then linearly within it
+        """
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.sum = 0.0
+
+    @staticmethod
+    def bucket(microseconds: int) -> int:
+        if microseconds < 2 * SUB_BUCKETS:
+            return microseconds
+        shift = microseconds.bit_length() - SUB_BUCKET_BITS - 1
+        return min(shift * SUB_BUCKETS + (microseconds >> shift), BUCKETS - 1)
+
+    @staticmethod
+    def bucket_limit(bucket: int) -> int:
+        """
+        Largest value in microseconds that falls into bucket
+        """
+        bucket += 1
+        if bucket < 2 * SUB_BUCKETS:
+            return bucket - 1
+        shift = bucket // SUB_BUCKETS - 1
+        return ((bucket % SUB_BUCKETS + SUB_BUCKETS) << shift) - 1
+
+    def record(self, seconds: float) -> None:
+        self.counts[self.bucket(int(seconds * 1e6))] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q: float) -> float:
+        """
+        Upper bound in seconds of the bucket holding the q-quantile
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.bucket_limit(bucket) / 1e6
+        return self.bucket_limit(BUCKETS - 1) / 1e6
+
+
+class Telemetry():
+    def __init__(self, frame_rate: Optional[int] = 60, log_interval: float = 10.0) -> None:
+        """
+        Counters and frame-time histograms, updated once per frame.
+
+        Late and dropped frames are only counted against frame_rate, pass None when
+        frames aren't paced.
+
+        Render time is the only thing measured inside a frame, by wrapping the
+        screen's update with attach_screen.
+        """
+        self.period = 1 / frame_rate if frame_rate else None
+        self.log_interval = log_interval
+
+        self.instructions = 0
+        self.frames = 0
+        self.late_frames = 0             # frames whose work took longer than the frame period
+        self.dropped_frames = 0          # whole frame periods missed by late frames
+        self.renders = 0
+
+        self.frame_interval = Histogram()    # time between the starts of consecutive frames
+        self.execute_time = Histogram()      # CPU time per frame, excluding rendering
+        self.render_time = Histogram()       # Screen.update time per frame
+
+        self.frame_render_time = 0.0
+        self.last_frame = None
+        self.instructions_per_second = 0.0
+        self.rate_start = time.perf_counter()
+        self.rate_instructions = 0
+        self.next_log = self.rate_start + log_interval
+
+    def attach_screen(self, screen) -> None:
+        """
+        Time every update of the screen
+        """
+        update = screen.update
+
+        def timed_update() -> None:
+            start = time.perf_counter()
+            update()
+            self.frame_render_time += time.perf_counter() - start
+            self.renders += 1
+
+        screen.update = timed_update
+
+    def idle(self) -> None:
+        """
+        Call before waiting for work with no frames running, so the gap isn't
+        recorded as a frame interval and the instruction rate drops to zero
+        """
+        self.last_frame = None
+        self.instructions_per_second = 0.0
+        self.rate_start = time.perf_counter()
+        self.rate_instructions = self.instructions
+
+    def frame(self, start: float, end: float, instructions: int) -> None:
+        """
+        Record a frame that started at `start`, finished its work at `end`
+        (both from time.perf_counter) and executed `instructions` instructions
+        """
+        work = end - start
+        self.instructions += instructions
+        self.frames += 1
+        if self.period and work > self.period:
+            self.late_frames += 1
+            self.dropped_frames += int(work / self.period)
+
+        if self.last_frame is not None:
+            self.frame_interval.record(start - self.last_frame)
+        self.last_frame = start
+        self.execute_time.record(work - self.frame_render_time)
+        self.render_time.record(self.frame_render_time)
+        self.frame_render_time = 0.0
+
+        if end - self.rate_start >= 1.0:
+            self.instructions_per_second = (self.instructions - self.rate_instructions) / (end - self.rate_start)
+            self.rate_start = end
+            self.rate_instructions = self.instructions
+
+        if end >= self.next_log:
+            self.next_log = end + self.log_interval
+            logger.info(self.summary())
+
+    def summary(self) -> str:
+        return "{:.4f} MIPS, frame p50 {:.1f}ms p99 {:.1f}ms, execute p99 {:.1f}ms, render p99 {:.1f}ms, {} late, {} dropped of {} frames".format(
+            self.instructions_per_second / 1e6,
+            self.frame_interval.quantile(0.5) * 1e3,
+            self.frame_interval.quantile(0.99) * 1e3,
+            self.execute_time.quantile(0.99) * 1e3,
+            self.render_time.quantile(0.99) * 1e3,
+            self.late_frames,
+            self.dropped_frames,
+            self.frames,
+        )
+
+    def prometheus(self) -> str:
+        """
+        Metrics in the Prometheus text exposition format
+        """
+        lines = []
+        for name, kind, help_text, value in (
+            ("chip8_instructions_total", "counter", "Instructions executed", self.instructions),
+            ("chip8_frames_total", "counter", "Frames run", self.frames),
+            ("chip8_late_frames_total", "counter", "Frames whose work took longer than the frame period", self.late_frames),
+            ("chip8_dropped_frames_total", "counter", "Frame periods missed by late frames", self.dropped_frames),
+            ("chip8_renders_total", "counter", "Screen updates", self.renders),
+            ("chip8_instructions_per_second", "gauge", "Emulated instructions per second over the last second", self.instructions_per_second),
+        ):
+            lines += ["# HELP {} {}".format(name, help_text), "# TYPE {} {}".format(name, kind), "{} {}".format(name, value)]
+
+        for name, help_text, histogram in (
+            ("chip8_frame_interval_seconds", "Time between the starts of consecutive frames", self.frame_interval),
+            ("chip8_execute_seconds", "CPU time per frame excluding rendering", self.execute_time),
+            ("chip8_render_seconds", "Screen update time per frame", self.render_time),
+        ):
+            lines += ["# HELP {} {}".format(name, help_text), "# TYPE {} summary".format(name)]
+            lines += ['{}{{quantile="{}"}} {}'.format(name, q, histogram.quantile(q)) for q in QUANTILES]
+            lines += ["{}_sum {}".format(name, histogram.sum), "{}_count {}".format(name, histogram.count)]
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int) -> ThreadingHTTPServer:
+        """
+        Serve /metrics on localhost:port from a background thread
+        """
+        telemetry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = telemetry.prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args) -> None:
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
@@ -0,0 +1,289 @@
+import argparse
+from collections import Counter
+from typing import Optional, Sequence
+
+import numpy as np
+
+DEFAULT_CAPACITY = 1 << 20
+ALL_REGISTERS = tuple(range(16))
+
+
+def trace_dtype(registers: Sequence[int]) -> np.dtype:
+    """
+    Record layout: step number, pc and opcode, I, then one byte per traced register
+    """
+    fields = [("step", "<u8"), ("pc", "<u2"), ("opcode", "<u2"), ("ir", "<u2")]
+    fields += [("v{:x}".format(r), "u1") for r in registers]
+    return np.dtype(fields)
+
+
+def check_registers(registers: Sequence[int]) -> list:
+    registers = list(registers)
+    if any(r not in ALL_REGISTERS for r in registers):
+        raise ValueError("registers must be between 0 and f: {}".format(registers))
+    if len(set(registers)) != len(registers):
+        raise ValueError("registers are listed more than once: {}".format(registers))
+    return registers
+
+
+def parse_registers(value: str) -> list:
+    """
+    Parse "01f" into registers [0, 1, 15] for argparse
+    """
+    try:
+        return check_registers(int(c, 16) for c in value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def parse_capacity(value: str) -> int:
+    capacity = int(value)
+    if capacity < 1:
+        raise argparse.ArgumentTypeError("trace size must be at least 1: {}".format(capacity))
+    return capacity
+
+
+class Tracer():
+    def __init__(self, cpu, capacity: int = DEFAULT_CAPACITY, registers: Sequence[int] = ALL_REGISTERS, path: Optional[str] = None) -> None:
+        """
+        Record the last `capacity` executed instructions of `cpu` in a ring buffer.
+
+        The buffers are only dumped to `path` on request or when an instruction raises.
+        """
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1: {}".format(capacity))
+        self.cpu = cpu
+        self.capacity = capacity
+        self.registers = check_registers(registers)
+        self.dtype = trace_dtype(self.registers)
+        self.path = path
+
+        # every record is written as 3 words (pc, opcode, I) and a copy of all 16 registers,
+        # through memoryviews which are much cheaper to index than the arrays themselves.
+        # The structured records, with only the selected registers, are built when dumping.
+        self.words = np.zeros((capacity, 3), dtype=np.uint16)
+        self.regs = np.zeros((capacity, 16), dtype=np.uint8)
+        self.word_view = memoryview(self.words.reshape(-1))
+        self.reg_view = memoryview(self.regs.reshape(-1))
+        self.steps = 0
+
+        self.execute = None
+
+    def attach(self) -> None:
+        """
+        Start recording every instruction executed by the CPU
+        """
+        self.execute = self.cpu.execute
+        self.cpu.execute = self.execute_traced
+
+    def detach(self) -> None:
+        """
+        Stop recording
+        """
+        self.cpu.execute = self.execute
+        self.execute = None
+
+    def execute_traced(self) -> None:
+        cpu = self.cpu
+        pc = cpu.pc
+        try:
+            self.execute()
+        except Exception:
+            self.record(pc)
+            if self.path:
+                self.dump(self.path)
+            raise
+
+        # same as record, inlined as this runs for every instruction
+        idx = self.steps % self.capacity
+        words = self.word_view
+        words[3 * idx] = pc
+        words[3 * idx + 1] = cpu.current_opcode
+        words[3 * idx + 2] = cpu.ir
+        self.reg_view[16 * idx:16 * idx + 16] = cpu.v.tobytes()
+        self.steps += 1
+
+    def record(self, pc: int) -> None:
+        """
+        Record the instruction at pc, with I and the registers as it left them
+        """
+        cpu = self.cpu
+        idx = self.steps % self.capacity
+        self.words[idx] = (pc, cpu.current_opcode, cpu.ir)
+        self.regs[idx] = cpu.v
+        self.steps += 1
+
+    def records(self) -> np.ndarray:
+        """
+        The recorded instructions, oldest first
+        """
+        count = min(self.steps, self.capacity)
+        order = np.arange(self.steps - count, self.steps) % self.capacity
+        records = np.zeros(count, dtype=self.dtype)
+        records["step"] = np.arange(self.steps - count, self.steps)
+        records["pc"] = self.words[order, 0]
+        records["opcode"] = self.words[order, 1]
+        records["ir"] = self.words[order, 2]
+        for r in self.registers:
+            records["v{:x}".format(r)] = self.regs[order, r]
+        return records
+
+    def dump(self, path: Optional[str] = None) -> str:
+        """
+        Write the recorded instructions to a .npy file that can be opened with
+        np.load(path, mmap_mode='r')
+        """
+        path = path or self.path
+        np.save(path, self.records())
+        print("Wrote {} instructions to {}".format(min(self.steps, self.capacity), path))
+        return path
+
+
+def load(path: str) -> np.ndarray:
+    return np.load(path, mmap_mode="r")
+
+
+def registers_of(trace: np.ndarray) -> list:
+    return [name for name in trace.dtype.names if name.startswith("v")]
+
+
+def format_record(record: np.void, registers: Sequence[str]) -> str:
+    regs = " ".join("{}={:02x}".format(r, record[r]) for r in registers)
+    return "{:>10} pc={:03x} op={:04x} i={:03x} {}".format(
+        record["step"], record["pc"], record["opcode"], record["ir"], regs
+    ).rstrip()
+
+
+def parse_range(value: str) -> tuple:
+    """
+    Parse "0x200" or "0x200-0x2ff" into an inclusive range
+    """
+    start, _, end = value.partition("-")
+    return int(start, 0), int(end or start, 0)
+
+
+def parse_mask(value: str) -> tuple:
+    """
+    Parse "0xd000/0xf000" into a (value, mask) pair, the mask defaults to 0xffff
+    """
+    match, _, mask = value.partition("/")
+    return int(match, 0), int(mask or "0xffff", 0)
+
+
+def filter_trace(trace: np.ndarray, pc: Optional[tuple] = None, opcode: Optional[tuple] = None) -> np.ndarray:
+    selected = np.ones(len(trace), dtype=bool)
+    if pc is not None:
+        selected &= (trace["pc"] >= pc[0]) & (trace["pc"] <= pc[1])
+    if opcode is not None:
+        selected &= (trace["opcode"] & opcode[1]) == opcode[0]
+    return trace[selected]
+
+
+def summarize(trace: np.ndarray, top: int = 10) -> None:
+    if len(trace) == 0:
+        print("empty trace")
+        return
+
+    print("instructions: {} (steps {} to {})".format(len(trace), trace["step"][0], trace["step"][-1]))
+    print("pc range: {:03x}-{:03x}".format(trace["pc"].min(), trace["pc"].max()))
+
+    print("instruction groups")
+    groups = Counter(dict(zip(*np.unique(trace["opcode"] >> 12, return_counts=True))))
+    for group, count in groups.most_common():
+        print("  {:x}___ {:>10} {:6.2f}%".format(group, count, 100.0 * count / len(trace)))
+
+    print("hottest addresses")
+    pcs, counts = np.unique(trace["pc"], return_counts=True)
+    for idx in np.argsort(counts)[::-1][:top]:
+        print("  {:03x} {:>10}".format(pcs[idx], counts[idx]))
+
+    print("last instructions")
+    registers = registers_of(trace)
+    for record in trace[-top:]:
+        print(format_record(record, registers))
+
+
+def step_range(trace: np.ndarray) -> str:
+    if len(trace) == 0:
+        return "no steps"
+    return "steps {} to {}".format(trace["step"][0], trace["step"][-1])
+
+
+def diff(a: np.ndarray, b: np.ndarray, context: int = 5) -> bool:
+    """
+    Print the first step at which two traces diverge, returns whether they diverge.
+
+    Records are matched by step number, so traces whose ring buffers kept different
+    windows of the same run are only compared where they overlap.
+    """
+    steps, ia, ib = np.intersect1d(a["step"], b["step"], return_indices=True)
+    if steps.size == 0:
+        print("traces don't overlap: a has {}, b has {}".format(step_range(a), step_range(b)))
+        return True
+    a_last, b_last = a["step"][-1], b["step"][-1]
+    a = a[ia]
+    b = b[ib]
+
+    fields = [name for name in a.dtype.names if name != "step" and name in b.dtype.names]
+    differs = np.zeros(len(steps), dtype=bool)
+    for name in fields:
+        differs |= a[name] != b[name]
+
+    if not differs.any():
+        print("traces match on steps {} to {}".format(steps[0], steps[-1]))
+        if a_last != b_last:
+            # e.g. one quirk profile crashed earlier than the other
+            print("a ends at step {}, b ends at step {}".format(a_last, b_last))
+            return True
+        return False
+
+    first = int(np.argmax(differs))
+    print("traces diverge at step {} ({} of {} common steps differ)".format(steps[first], int(differs.sum()), len(steps)))
+    registers = [name for name in fields if name.startswith("v")]
+    for idx in range(max(first - context, 0), min(first + context + 1, len(steps))):
+        marker = "!" if differs[idx] else " "
+        print("{} a {}".format(marker, format_record(a[idx], registers)))
+        print("{} b {}".format(marker, format_record(b[idx], registers)))
+    return True
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m chip8.trace", description="Inspect traces recorded with --trace")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    summary_parser = commands.add_parser("summary", help="Summarize a trace")
+    summary_parser.add_argument("trace")
+    summary_parser.add_argument("--top", type=int, default=10, help="Number of entries in each list")
+
+    filter_parser = commands.add_parser("filter", help="Print matching instructions")
+    filter_parser.add_argument("trace")
+    filter_parser.add_argument("--pc", type=parse_range, help="Address or range, e.g. 0x200-0x2ff")
+    filter_parser.add_argument("--opcode", type=parse_mask, help="Opcode with optional mask, e.g. 0xd000/0xf000")
+    filter_parser.add_argument("--last", type=int, help="Only print the last N matches")
+    filter_parser.add_argument("--output", help="Write the matches to a new trace file instead")
+
+    diff_parser = commands.add_parser("diff", help="Find where two traces diverge")
+    diff_parser.add_argument("a")
+    diff_parser.add_argument("b")
+    diff_parser.add_argument("--context", type=int, default=5, help="Instructions to show around the divergence")
+
+    args = parser.parse_args()
+
+    if args.command == "summary":
+        summarize(load(args.trace), args.top)
+    elif args.command == "filter":
+        trace = filter_trace(load(args.trace), args.pc, args.opcode)
+        if args.last:
+            trace = trace[-args.last:]
+        if args.output:
+            np.save(args.output, trace)
+        else:
+            registers = registers_of(trace)
+            for record in trace:
+                print(format_record(record, registers))
+    elif args.command == "diff":
+        if diff(load(args.a), load(args.b), args.context):
+            raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()